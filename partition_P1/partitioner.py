@@ -4,10 +4,10 @@ Implements the hybrid circuit partitioning algorithm for the 2-Fold Synthesizer
 
 This script takes a collapsed circuit graph (as a NetworkX object saved in a 
 .gpickle file) and partitions it using a hybrid approach:
-1. Coarse Partitioning: Uses K-way Spectral Clustering to find functionally
-   related clusters of gates.
-2. Boundary Refinement: Iteratively applies the Kernighan-Lin (KL) algorithm
-   to pairs of adjacent partitions to minimize the cut size (wire crossings).
+1. Coarse Partitioning: Uses METIS multilevel k-way partitioning (or K-way
+   Spectral Clustering as a fallback) to find functionally related clusters of gates.
+2. Boundary Refinement: Iteratively applies a best-node-first Kernighan-Lin (KL)
+   algorithm to pairs of adjacent partitions to minimize the cut size (wire crossings).
 3. I/O Balancing: Performs a final greedy pass to improve I/O balance for
    each partition without significantly increasing the cut size.
 
@@ -20,15 +20,49 @@ To use this script:
 """
 
 import argparse
+import heapq
 import math
 import pickle
-import itertools
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from typing import NamedTuple
 
 import networkx as nx
 import numpy as np
+import scipy.sparse as sp
 from sklearn.cluster import SpectralClustering
 
+from partitioner_kernels import boundary_mask, compute_cut, kl_refine
+
+# METIS is optional; without it the coarse step falls back to Spectral Clustering
+# pip install "pymetis>=2025.2"  (for pymetis.CSRAdjacency)
+try:
+    import pymetis
+except ImportError:
+    pymetis = None
+
+# The AMG eigensolver is much faster than ARPACK on large sparse Laplacians
+# pip install pyamg
+try:
+    import pyamg  # noqa: F401
+    SPECTRAL_EIGEN_SOLVER = 'amg'
+except ImportError:
+    SPECTRAL_EIGEN_SOLVER = 'arpack'
+
+
+class CsrGraph(NamedTuple):
+    """
+    A circuit graph as integer arrays, the layout of verilog_to_graph.save_csr.
+
+    Node i is names[i]. The directed edges are (edges_src[e], edges_dst[e]), and
+    indptr/indices hold the undirected CSR adjacency in the same node order.
+    """
+    names: list
+    edges_src: np.ndarray
+    edges_dst: np.ndarray
+    indptr: np.ndarray
+    indices: np.ndarray
+
 
 def _calculate_cut_size(graph: nx.DiGraph, partitions: list[set]) -> int:
     """Calculates the total number of edges between all partitions."""
@@ -42,220 +76,421 @@ def _calculate_cut_size(graph: nx.DiGraph, partitions: list[set]) -> int:
             
     return cut_size
 
-def _get_io_for_partition(graph: nx.DiGraph, partition_nodes: set) -> tuple[int, int]:
-    """Calculates the number of input and output signals for a single partition."""
-    inputs = set()
-    outputs = set()
+def _get_io_for_partitions(graph: CsrGraph, partitions: list[set]) -> list[tuple[int, int]]:
+    """
+    Calculates the number of input and output signals for every partition at once.
+
+    A partition's inputs are the distinct external nodes driving one of its nodes,
+    and its outputs the distinct external nodes driven by one of its nodes. The
+    distinct (partition, node) pairs of all cut edges are counted in one pass.
+    """
+    node_ids = {node: i for i, node in enumerate(graph.names)}
+    part_of = np.full(len(graph.names), -1, dtype=np.int32)
+    for i, p in enumerate(partitions):
+        part_of[[node_ids[node] for node in p]] = i
+
+    part_u, part_v = part_of[graph.edges_src], part_of[graph.edges_dst]
+    is_cut = part_u != part_v
+
+    def count_distinct(parts: np.ndarray, nodes: np.ndarray) -> np.ndarray:
+        keep = parts >= 0
+        pairs = np.unique(np.stack((parts[keep], nodes[keep]), axis=1), axis=0)
+        return np.bincount(pairs[:, 0], minlength=len(partitions))
+
+    inputs = count_distinct(part_v[is_cut], graph.edges_src[is_cut])
+    outputs = count_distinct(part_u[is_cut], graph.edges_dst[is_cut])
+    return list(zip(inputs.tolist(), outputs.tolist()))
+
+def _csr_from_graph(graph: nx.DiGraph) -> CsrGraph:
+    """Converts a NetworkX graph to the integer array layout of CsrGraph."""
+    names = list(graph.nodes())
+    node_ids = {node: i for i, node in enumerate(names)}
+    num_edges = graph.number_of_edges()
+    edges_src = np.fromiter((node_ids[u] for u, _ in graph.edges()), dtype=np.int32, count=num_edges)
+    edges_dst = np.fromiter((node_ids[v] for _, v in graph.edges()), dtype=np.int32, count=num_edges)
+    if not names:
+        # nx.to_scipy_sparse_array raises on a graph without nodes
+        return CsrGraph(names, edges_src, edges_dst, np.zeros(1, dtype=np.int32), np.empty(0, dtype=np.int32))
+    adj = nx.to_scipy_sparse_array(graph.to_undirected(), nodelist=names, format='csr')
+    return CsrGraph(names, edges_src, edges_dst, adj.indptr.astype(np.int32), adj.indices.astype(np.int32))
+
+def _build_io_refs(
+    edges_u: np.ndarray, 
+    edges_v: np.ndarray, 
+    part_of: np.ndarray, 
+    num_partitions: int
+) -> tuple[list[defaultdict], list[defaultdict]]:
+    """
+    Builds per-partition reference counts of external input and output signals.
+
+    in_refs[p][u] is the number of edges from the external node u into partition p,
+    and out_refs[p][v] the number of edges from partition p to the external node v,
+    so len(in_refs[p]), len(out_refs[p]) match _get_io_for_partitions for p.
+    Nodes are integer ids and part_of[i] is the partition of node i.
+    """
+    in_refs = [defaultdict(int) for _ in range(num_partitions)]
+    out_refs = [defaultdict(int) for _ in range(num_partitions)]
     
-    for node in partition_nodes:
-        # Check predecessors for external inputs
-        for pred in graph.predecessors(node):
-            if pred not in partition_nodes:
-                inputs.add(pred)
-        # Check successors for external outputs
-        for succ in graph.successors(node):
-            if succ not in partition_nodes:
-                outputs.add(succ)
-                
-    return len(inputs), len(outputs)
-
-def _find_adjacent_partitions(graph: nx.DiGraph, partitions: list[set]) -> list[tuple[int, int]]:
-    """Finds pairs of partition indices that have edges between them."""
-    adj_pairs = set()
+    part_u, part_v = part_of[edges_u], part_of[edges_v]
+    is_cut = part_u != part_v
+    for u, v, pu, pv in zip(
+        edges_u[is_cut].tolist(), edges_v[is_cut].tolist(), 
+        part_u[is_cut].tolist(), part_v[is_cut].tolist()
+    ):
+        in_refs[pv][u] += 1
+        out_refs[pu][v] += 1
+            
+    return in_refs, out_refs
+
+def _io_move_deltas(
+    predecessors: list[tuple], 
+    successors: list[tuple], 
+    node: int, 
+    src: int, 
+    dst: int, 
+    part_of: np.ndarray
+) -> tuple[dict, dict, dict, dict]:
+    """
+    Calculates how moving a node from partition src to dst changes the I/O
+    reference counts of both partitions. Only the node's incident edges are visited.
+
+    Returns the (src_in, src_out, dst_in, dst_out) count deltas. The node's own
+    entries in dst's reference counts are dropped on the move and are not included.
+    """
+    src_in, src_out = defaultdict(int), defaultdict(int)
+    dst_in, dst_out = defaultdict(int), defaultdict(int)
     
-    for i, part_A in enumerate(partitions):
-        for j, part_B in enumerate(partitions):
-            if i >= j:
-                continue
+    for pred in predecessors[node]:
+        if pred == node:
+            continue
+        pred_part = part_of[pred]
+        if pred_part == src:
+            src_out[node] += 1 # Internal edge becomes an output of src
+        else:
+            src_in[pred] -= 1
+        if pred_part != dst:
+            dst_in[pred] += 1 # External driver becomes an input of dst
             
-            # Use itertools.product for an efficient cartesian product of nodes
-            is_adjacent = any(
-                graph.has_edge(u, v) or graph.has_edge(v, u)
-                for u, v in itertools.product(part_A, part_B)
-            )
+    for succ in successors[node]:
+        if succ == node:
+            continue
+        succ_part = part_of[succ]
+        if succ_part == src:
+            src_in[node] += 1 # Internal edge becomes an input of src
+        else:
+            src_out[succ] -= 1
+        if succ_part != dst:
+            dst_out[succ] += 1 # External sink becomes an output of dst
             
-            if is_adjacent:
-                adj_pairs.add((i, j))
-                
-    return list(adj_pairs)
+    return src_in, src_out, dst_in, dst_out
+
+def _refs_size_after(refs: dict, delta: dict, dropped=None) -> int:
+    """Returns the number of referenced signals after applying a delta, without mutating refs."""
+    size = len(refs) - (dropped in refs)
+    for key, change in delta.items():
+        before = refs.get(key, 0)
+        size += (before + change > 0) - (before > 0)
+    return size
+
+def _apply_refs_delta(refs: dict, delta: dict, dropped=None) -> None:
+    """Applies a delta to a reference count dict in place, removing keys that reach zero."""
+    refs.pop(dropped, None)
+    for key, change in delta.items():
+        count = refs.get(key, 0) + change
+        if count > 0:
+            refs[key] = count
+        else:
+            refs.pop(key, None)
+
+def _kl_worker(args: tuple) -> np.ndarray:
+    """Refines one pair's bisection from its CSR adjacency with kl_refine (process pool entry point)."""
+    indptr, indices, weights, side, max_iter = args
+    return kl_refine(indptr, indices, weights, side, max_iter)
+
+def _group_by_partition(part_of: np.ndarray, num_partitions: int) -> list[np.ndarray]:
+    """Returns the node ids of every partition, grouped with one stable argsort of part_of."""
+    order = np.argsort(part_of, kind='stable')
+    bounds = np.cumsum(np.bincount(part_of, minlength=num_partitions))[:-1]
+    return np.split(order, bounds)
+
+def _matching_rounds(adjacent_pairs: list[tuple[int, int]]) -> list[list[tuple[int, int]]]:
+    """
+    Groups adjacent partition pairs into rounds where no partition appears twice,
+    by repeatedly extracting a maximal matching from the partition adjacency graph.
+    Pairs within a round are independent and can be refined concurrently.
+    """
+    remaining = nx.Graph(adjacent_pairs)
+    rounds = []
+    while remaining.number_of_edges() > 0:
+        matching = sorted((min(u, v), max(u, v)) for u, v in nx.maximal_matching(remaining))
+        remaining.remove_edges_from(matching)
+        rounds.append(matching)
+    return rounds
+
+def _spectral_labels(adj_matrix, k: int) -> np.ndarray:
+    """Assigns each node to one of k clusters with Spectral Clustering."""
+    sc = SpectralClustering(
+        n_clusters=k, 
+        assign_labels='kmeans', 
+        affinity='precomputed',
+        random_state=42,
+        eigen_solver=SPECTRAL_EIGEN_SOLVER,
+        n_init=3
+    )
+    return sc.fit_predict(adj_matrix)
+
+def _metis_labels(adj_matrix, k: int) -> np.ndarray:
+    """Assigns each node to one of k parts with METIS multilevel k-way partitioning."""
+    # METIS expects a symmetric adjacency without self-loops
+    adj_matrix = adj_matrix.copy()
+    adj_matrix.setdiag(0)
+    adj_matrix.eliminate_zeros()
+    
+    adjacency = pymetis.CSRAdjacency(
+        adj_matrix.indptr.astype(np.int32), adj_matrix.indices.astype(np.int32)
+    )
+    _, labels = pymetis.part_graph(k, adjacency=adjacency)
+    return np.asarray(labels)
 
 def hybrid_partitioner(
-    graph: nx.DiGraph, 
+    graph: nx.DiGraph | CsrGraph, 
     target_partition_size: int, 
     kl_max_iter: int = 10,
-    io_balance_alpha: float = 0.1
+    io_balance_alpha: float = 0.1,
+    kl_workers: int | None = 1,
+    coarse_method: str = 'metis'
 ) -> list[set]:
     """
     Executes the full hybrid partitioning algorithm.
 
     Args:
-        graph (nx.DiGraph): The collapsed circuit graph to partition.
+        graph (nx.DiGraph | CsrGraph): The collapsed circuit graph to partition.
+                                       A CsrGraph is used as is, without building
+                                       any NetworkX structure.
         target_partition_size (int): The desired average size for each partition.
         kl_max_iter (int): The max number of iterations for each Kernighan-Lin run.
         io_balance_alpha (float): A weighting factor for how strongly to prioritize
                                  I/O balance over cut size during the final pass.
+        kl_workers (int | None): The number of processes used to refine independent
+                                 partition pairs concurrently. 1 runs KL in-process,
+                                 None uses all available cores.
+        coarse_method (str): The coarse partitioning method, 'metis' or 'spectral'.
+                             Falls back to 'spectral' if pymetis is not installed.
 
     Returns:
         list[set]: A list where each element is a set of nodes representing a partition.
     """
-    num_nodes = graph.number_of_nodes()
+    # Work on contiguous integer node ids; edges are two int32 arrays
+    if isinstance(graph, nx.DiGraph):
+        graph = _csr_from_graph(graph)
+    node_list = graph.names
+    num_nodes = len(node_list)
     if num_nodes == 0:
         return []
-
-    # === 1. Coarse Partitioning with Spectral Clustering ===
-    print(f"🔬 1. Starting Coarse Partitioning (Spectral Clustering)...")
+    edges_u, edges_v = graph.edges_src, graph.edges_dst
+
+    # === 1. Coarse Partitioning with METIS or Spectral Clustering ===
+    if coarse_method == 'metis' and pymetis is None:
+        print("Warning: pymetis not found. Falling back to Spectral Clustering.")
+        coarse_method = 'spectral'
+    method_name = 'METIS' if coarse_method == 'metis' else 'Spectral Clustering'
+    print(f"🔬 1. Starting Coarse Partitioning ({method_name})...")
     
     # Calculate k, the number of partitions
     k = math.ceil(num_nodes / target_partition_size)
     if k < 2:
         print("   - Graph is too small to partition further. Returning single partition.")
-        return [set(graph.nodes())]
+        return [set(node_list)]
 
     print(f"   - Target partitions (k): {k}")
     
-    # Spectral clustering works on the adjacency matrix of an undirected graph
+    # Both methods work on the adjacency matrix of an undirected graph
     # to capture the notion of 'closeness' or 'community'.
-    undirected_graph = graph.to_undirected()
-    adj_matrix = nx.to_scipy_sparse_array(undirected_graph, format='csr')
-    
-    # Fix for scikit-learn on Windows: force sparse matrix indices to be 32-bit
-    adj_matrix.indices = adj_matrix.indices.astype(np.int32)
-    adj_matrix.indptr = adj_matrix.indptr.astype(np.int32)
-    
-    sc = SpectralClustering(
-        n_clusters=k, 
-        assign_labels='kmeans', 
-        affinity='precomputed',
-        random_state=42
+    # It is built once in node id order and also sliced per pair for KL refinement.
+    # Fix for scikit-learn on Windows: the sparse matrix indices stay 32-bit
+    adj_matrix = sp.csr_array(
+        (np.ones(len(graph.indices)), graph.indices.astype(np.int32), graph.indptr.astype(np.int32)),
+        shape=(num_nodes, num_nodes)
     )
-    labels = sc.fit_predict(adj_matrix)
     
-    partitions = [set() for _ in range(k)]
-    node_list = list(undirected_graph.nodes())
-    for i, node in enumerate(node_list):
-        partitions[labels[i]].add(node)
+    if coarse_method == 'metis':
+        labels = _metis_labels(adj_matrix, k)
+    else:
+        labels = _spectral_labels(adj_matrix, k)
     
-    print(f"   - Initial cut size: {_calculate_cut_size(graph, partitions)}")
+    # Membership is a dense array over the integer node ids: part_of[i] is node i's partition.
+    part_of = np.asarray(labels, dtype=np.int32)
+    
+    print(f"   - Initial cut size: {compute_cut(edges_u, edges_v, part_of)}")
 
     # === 2. Boundary Refinement with Kernighan-Lin ===
     print(f"\n⚡ 2. Starting Boundary Refinement (Kernighan-Lin)...")
     print(f"   - KL max iterations per pair: {kl_max_iter}")
 
-    # Find which partitions are physically connected
-    adjacent_pairs = _find_adjacent_partitions(graph, partitions)
+    # Find which partitions are physically connected: every cut edge names its pair
+    part_u, part_v = part_of[edges_u], part_of[edges_v]
+    is_cut = part_u != part_v
+    pair_array = np.unique(
+        np.stack((np.minimum(part_u, part_v)[is_cut], np.maximum(part_u, part_v)[is_cut]), axis=1), 
+        axis=0
+    )
+    adjacent_pairs = [tuple(pair) for pair in pair_array.tolist()]
     print(f"   - Found {len(adjacent_pairs)} adjacent partition pairs to refine.")
 
-    for i, j in adjacent_pairs:
-        # Create a subgraph containing only the nodes from the two adjacent partitions
-        part_A, part_B = partitions[i], partitions[j]
-        subgraph_nodes = list(part_A.union(part_B))
-        subgraph = graph.subgraph(subgraph_nodes).to_undirected()
+    # Pairs that share no partition are independent, so each round can be refined in parallel
+    rounds = _matching_rounds(adjacent_pairs)
+    print(f"   - Grouped into {len(rounds)} rounds of independent pairs.")
 
-        # Run KL bisection to re-partition this subgraph
-        # The seed ensures that the initial partition is consistent
-        refined_A, refined_B = nx.community.kernighan_lin_bisection(
-            subgraph, max_iter=kl_max_iter, seed=42
-        )
-        
-        # Update the main partitions list with the refined sets
-        partitions[i] = refined_A
-        partitions[j] = refined_B
+    executor = ProcessPoolExecutor(max_workers=kl_workers) if kl_workers != 1 else None
+    try:
+        for round_pairs in rounds:
+            # Pairs in a round are disjoint, so membership taken at the start of the round stays valid
+            members = _group_by_partition(part_of, k)
+            jobs, job_nodes = [], []
+            for i, j in round_pairs:
+                # Slice the induced undirected CSR of the two adjacent partitions by their row ids
+                rows = np.concatenate((members[i], members[j]))
+                sub = adj_matrix[rows][:, rows]
+                side = np.zeros(len(rows), dtype=np.bool_)
+                side[:len(members[i])] = True
+                jobs.append((sub.indptr, sub.indices, sub.data, side, kl_max_iter))
+                job_nodes.append(rows)
+
+            # Refine the current boundary between each pair of partitions with KL
+            results = executor.map(_kl_worker, jobs) if executor else map(_kl_worker, jobs)
+
+            # Write the refined sides back into the membership array
+            for (i, j), nodes, side in zip(round_pairs, job_nodes, results):
+                part_of[nodes] = np.where(side, i, j)
+    finally:
+        if executor:
+            executor.shutdown()
         
-    print(f"   - Cut size after KL refinement: {_calculate_cut_size(graph, partitions)}")
+    print(f"   - Cut size after KL refinement: {compute_cut(edges_u, edges_v, part_of)}")
     
     # === 3. I/O Balancing (Greedy Post-Processing) ===
     print(f"\n⚖️  3. Starting I/O Balancing...")
     
     # This is a greedy approach. It repeatedly finds the best node to move
     # based on a cost function that considers both cut size and I/O balance.
-    node_to_partition = {node: i for i, p in enumerate(partitions) for node in p}
-
-    # Failsafe: Limit the number of I/O balancing iterations. One pass per node is a reasonable upper bound.
-    MAX_IO_BALANCE_ITERATIONS = graph.number_of_nodes()
-    for iteration in range(MAX_IO_BALANCE_ITERATIONS):
-        best_move = {'node': None, 'target_partition': -1, 'cost_improvement': -np.inf}
+    in_refs, out_refs = _build_io_refs(edges_u, edges_v, part_of, k)
+
+    # Cache every node's predecessors followed by its successors, as nx.all_neighbors
+    # yields them, so each directed edge is still counted once in the cut gain
+    predecessors = [[] for _ in range(num_nodes)]
+    successors = [[] for _ in range(num_nodes)]
+    for u, v in zip(edges_u.tolist(), edges_v.tolist()):
+        predecessors[v].append(u)
+        successors[u].append(v)
+    predecessors = [tuple(preds) for preds in predecessors]
+    successors = [tuple(succs) for succs in successors]
+    neighbors = [preds + succs for preds, succs in zip(predecessors, successors)]
+
+    def best_move_for(node: int) -> tuple[float, int]:
+        """Returns the highest total gain over this node's neighboring partitions, and that partition."""
+        best_gain, best_target = -np.inf, -1
+        current_part_idx = part_of[node]
+            
+        # Find which partitions this node is connected to
+        neighbor_partitions = {part_of[neighbor] for neighbor in neighbors[node]}
         
-        # Find all nodes on the boundaries of partitions
-        boundary_nodes = {
-            node for u, v in graph.edges() 
-            for node in (u, v) 
-            if node_to_partition.get(u) != node_to_partition.get(v)
-        }
-
-        if not boundary_nodes:
-            break # No more boundary nodes to move
+        for target_part_idx in neighbor_partitions:
+            if target_part_idx == current_part_idx:
+                continue
+
+            # --- Calculate the cost of moving this node ---
+            # 1. Change in Cut Size (Gain)
+            cut_gain = 0
+            for neighbor in neighbors[node]:
+                neighbor_part_idx = part_of[neighbor]
+                if neighbor_part_idx == current_part_idx:
+                    cut_gain -= 1 # Moving away from an internal node increases cut
+                elif neighbor_part_idx == target_part_idx:
+                    cut_gain += 1 # Moving towards an external node decreases cut
             
-        for node in boundary_nodes:
-            current_part_idx = node_to_partition[node]
+            # 2. Change in I/O Imbalance
+            # Evaluated from the cached reference counts instead of rescanning both partitions
+            src_in, src_out, dst_in, dst_out = _io_move_deltas(
+                predecessors, successors, node, current_part_idx, target_part_idx, part_of
+            )
+            io_before_move = (
+                abs(len(in_refs[current_part_idx]) - len(out_refs[current_part_idx]))
+                + abs(len(in_refs[target_part_idx]) - len(out_refs[target_part_idx]))
+            )
+            io_after_move = (
+                abs(_refs_size_after(in_refs[current_part_idx], src_in)
+                    - _refs_size_after(out_refs[current_part_idx], src_out))
+                + abs(_refs_size_after(in_refs[target_part_idx], dst_in, node)
+                      - _refs_size_after(out_refs[target_part_idx], dst_out, node))
+            )
+
+            io_gain = io_before_move - io_after_move
             
-            # Find which partitions this node is connected to
-            neighbor_partitions = {
-                node_to_partition[neighbor] 
-                for neighbor in nx.all_neighbors(graph, node) 
-                if neighbor in node_to_partition
-            }
+            # Total cost combines cut size gain and I/O balance gain
+            total_gain = cut_gain + io_balance_alpha * io_gain
             
-            for target_part_idx in neighbor_partitions:
-                if target_part_idx == current_part_idx:
-                    continue
-
-                # --- Calculate the cost of moving this node ---
-                # 1. Change in Cut Size (Gain)
-                cut_gain = 0
-                for neighbor in nx.all_neighbors(graph, node):
-                    if not neighbor in node_to_partition: continue
-                    
-                    neighbor_part_idx = node_to_partition[neighbor]
-                    if neighbor_part_idx == current_part_idx:
-                        cut_gain -= 1 # Moving away from an internal node increases cut
-                    elif neighbor_part_idx == target_part_idx:
-                        cut_gain += 1 # Moving towards an external node decreases cut
-                
-                # 2. Change in I/O Imbalance
-                io_before_move = 0
-                io_after_move = 0
-                
-                # Analyze partitions affected by the move
-                for part_idx in {current_part_idx, target_part_idx}:
-                    # Simulate the state before and after the move for this partition
-                    nodes_before = partitions[part_idx]
-                    if part_idx == current_part_idx:
-                        nodes_after = nodes_before - {node}
-                    else: # target_part_idx
-                        nodes_after = nodes_before | {node}
-
-                    i_before, o_before = _get_io_for_partition(graph, nodes_before)
-                    i_after, o_after = _get_io_for_partition(graph, nodes_after)
-                    
-                    io_before_move += abs(i_before - o_before)
-                    io_after_move += abs(i_after - o_after)
-
-                io_gain = io_before_move - io_after_move
-                
-                # Total cost combines cut size gain and I/O balance gain
-                total_gain = cut_gain + io_balance_alpha * io_gain
-                
-                if total_gain > best_move['cost_improvement']:
-                    best_move = {
-                        'node': node, 
-                        'target_partition': target_part_idx,
-                        'cost_improvement': total_gain
-                    }
-
-        if best_move['cost_improvement'] > 0:
-            # Perform the best move found in this pass
-            node_to_move = best_move['node']
-            target_idx = best_move['target_partition']
-            current_idx = node_to_partition[node_to_move]
-
-            partitions[current_idx].remove(node_to_move)
-            partitions[target_idx].add(node_to_move)
-            node_to_partition[node_to_move] = target_idx
-        else:
-            # No move provides improvement, so we are done
-            break 
+            if total_gain > best_gain:
+                best_gain, best_target = total_gain, target_part_idx
+
+        return best_gain, best_target
+
+    # Fiduccia-Mattheyses style priority queue of (-gain, node, version, target) entries.
+    # An entry is stale once its node's version moves on (lazy deletion). Since the I/O
+    # terms also depend on partitions shared with non-neighbors, a popped entry is
+    # re-evaluated and requeued if it is no longer at least as good as the next one.
+    version = [0] * num_nodes
+    move_queue = []
+    for node in np.flatnonzero(boundary_mask(edges_u, edges_v, part_of)).tolist():
+        gain, target = best_move_for(node)
+        if target != -1:
+            move_queue.append((-gain, node, 0, target))
+    heapq.heapify(move_queue)
+
+    # Failsafe: Limit the number of I/O balancing moves. One move per node is a reasonable upper bound.
+    MAX_IO_BALANCE_MOVES = num_nodes
+    num_moves = 0
+    while move_queue and num_moves < MAX_IO_BALANCE_MOVES:
+        _, node, node_version, _ = heapq.heappop(move_queue)
+        if node_version != version[node]:
+            continue
+
+        gain, target_idx = best_move_for(node)
+        if target_idx == -1:
+            continue # No longer on a boundary
+        if move_queue and gain < -move_queue[0][0]:
+            # Its gain dropped below another candidate's; requeue with the fresh value
+            version[node] += 1
+            heapq.heappush(move_queue, (-gain, node, version[node], target_idx))
+            continue
+        if gain <= 0:
+            break # No move provides improvement, so we are done
+
+        # Perform the best move found
+        current_idx = part_of[node]
+
+        # Update the I/O reference counts using only the moved node's edges
+        src_in, src_out, dst_in, dst_out = _io_move_deltas(
+            predecessors, successors, node, current_idx, target_idx, part_of
+        )
+        _apply_refs_delta(in_refs[current_idx], src_in)
+        _apply_refs_delta(out_refs[current_idx], src_out)
+        _apply_refs_delta(in_refs[target_idx], dst_in, node)
+        _apply_refs_delta(out_refs[target_idx], dst_out, node)
+
+        part_of[node] = target_idx
+        num_moves += 1
+
+        # Only the moved node and its neighbors can change cut gain or boundary status
+        for affected in {node, *neighbors[node]}:
+            version[affected] += 1
+            gain, target = best_move_for(affected)
+            if target != -1:
+                heapq.heappush(move_queue, (-gain, affected, version[affected], target))
             
-    print(f"   - Final cut size after I/O balancing: {_calculate_cut_size(graph, partitions)}")
+    print(f"   - Final cut size after I/O balancing: {compute_cut(edges_u, edges_v, part_of)}")
+
+    # Rebuild the partition sets from the membership array
+    partitions = [{node_list[i] for i in ids} for ids in _group_by_partition(part_of, k)]
     
     # Filter out any empty partitions that may have been created
     final_partitions = [p for p in partitions if p]
@@ -263,12 +498,29 @@ def hybrid_partitioner(
     return final_partitions
 
 
+def load_csr_graph(path: str) -> CsrGraph:
+    """
+    Loads a graph saved in the compact CSR format of verilog_to_graph.save_csr.
+
+    The stored arrays are handed to the partitioner as they are, so no DiGraph
+    is built and the undirected adjacency is not recomputed.
+    """
+    with np.load(path) as data:
+        return CsrGraph(
+            data['names'].tolist(),
+            data['edges_src'].astype(np.int32),
+            data['edges_dst'].astype(np.int32),
+            data['indptr'].astype(np.int32),
+            data['indices'].astype(np.int32),
+        )
+
 def main():
     """Main function to run the partitioner from the command line."""
     parser = argparse.ArgumentParser(description="Hybrid Circuit Partitioner")
     parser.add_argument(
         "graph_file", 
-        help="Path to the input .gpickle file containing the NetworkX graph."
+        help="Path to the input .gpickle file containing the NetworkX graph, "
+             "or a .npz file in the compact CSR format."
     )
     parser.add_argument(
         "--target-size", 
@@ -288,6 +540,18 @@ def main():
         default=0.1, 
         help="Weighting factor for I/O balance vs. cut size. (Default: 0.1)"
     )
+    parser.add_argument(
+        "--kl-workers", 
+        type=int, 
+        default=None, 
+        help="Number of processes for parallel KL refinement. (Default: all cores)"
+    )
+    parser.add_argument(
+        "--coarse", 
+        choices=['metis', 'spectral'], 
+        default='metis', 
+        help="Coarse partitioning method. (Default: metis, spectral if pymetis is missing)"
+    )
     parser.add_argument(
         "-o", "--output-file", 
         help="Path to save the final partition data as a text file."
@@ -296,10 +560,13 @@ def main():
 
     # Load the graph
     try:
-        with open(args.graph_file, 'rb') as f:
-            circuit_graph = pickle.load(f)
+        if args.graph_file.endswith('.npz'):
+            circuit_graph = load_csr_graph(args.graph_file)
+        else:
+            with open(args.graph_file, 'rb') as f:
+                circuit_graph = _csr_from_graph(pickle.load(f))
         print(f"✅ Graph '{args.graph_file}' loaded successfully.")
-        print(f"   - Nodes: {circuit_graph.number_of_nodes()}, Edges: {circuit_graph.number_of_edges()}")
+        print(f"   - Nodes: {len(circuit_graph.names)}, Edges: {len(circuit_graph.edges_src)}")
     except FileNotFoundError:
         print(f"❌ Error: The file '{args.graph_file}' was not found.")
         return
@@ -312,7 +579,9 @@ def main():
         circuit_graph, 
         args.target_size, 
         args.kl_iter,
-        args.io_factor
+        args.io_factor,
+        args.kl_workers,
+        args.coarse
     )
 
     # Print and save results
@@ -321,23 +590,25 @@ def main():
     print("="*30)
     print(f"Total Partitions Created: {len(final_partitions)}\n")
     
-    output_lines = []
+    partition_io = _get_io_for_partitions(circuit_graph, final_partitions)
     for i, p in enumerate(final_partitions):
-        num_inputs, num_outputs = _get_io_for_partition(circuit_graph, p)
-        line1 = f"--- Partition {i} ---"
-        line2 = f"  - Size: {len(p)} nodes"
-        line3 = f"  - I/O: {num_inputs} inputs, {num_outputs} outputs"
-        print(line1, line2, line3, sep='\n')
-        if args.output_file:
-            output_lines.append(line1)
-            output_lines.append(line2)
-            output_lines.append(line3)
-            output_lines.append(f"  - Nodes: {sorted(list(p))}\n")
+        num_inputs, num_outputs = partition_io[i]
+        print(f"--- Partition {i} ---")
+        print(f"  - Size: {len(p)} nodes")
+        print(f"  - I/O: {num_inputs} inputs, {num_outputs} outputs")
     
     if args.output_file:
         try:
+            # Stream one partition at a time; entries are separated by a blank line
             with open(args.output_file, 'w') as f:
-                f.write('\n'.join(output_lines))
+                for i, p in enumerate(final_partitions):
+                    num_inputs, num_outputs = partition_io[i]
+                    if i > 0:
+                        f.write("\n")
+                    f.write(f"--- Partition {i} ---\n")
+                    f.write(f"  - Size: {len(p)} nodes\n")
+                    f.write(f"  - I/O: {num_inputs} inputs, {num_outputs} outputs\n")
+                    f.write(f"  - Nodes: {sorted(p)}\n")
             print(f"\n💾 Partition data saved to: {args.output_file}")
         except Exception as e:
             print(f"\n❌ Could not save output file. Reason: {e}")
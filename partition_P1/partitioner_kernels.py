@@ -0,0 +1,156 @@
+# partitioner_kernels.py
+"""
+Numba-compiled kernels for the hot loops of partitioner.py.
+
+Every kernel works on plain integer/float arrays (CSR adjacency, edge lists and the
+dense partition membership array), so Numba can compile it to machine code. The
+compiled code is cached on disk (cache=True), so only the first run pays for JIT.
+
+Requires numba:
+   pip install numba
+"""
+
+import heapq
+
+import numpy as np
+from numba import njit
+
+
+@njit(cache=True)
+def compute_cut(edges_u: np.ndarray, edges_v: np.ndarray, part_of: np.ndarray) -> int:
+    """Counts the edges whose endpoints lie in different partitions."""
+    cut = 0
+    for e in range(edges_u.shape[0]):
+        if part_of[edges_u[e]] != part_of[edges_v[e]]:
+            cut += 1
+    return cut
+
+@njit(cache=True)
+def boundary_mask(edges_u: np.ndarray, edges_v: np.ndarray, part_of: np.ndarray) -> np.ndarray:
+    """Marks every node that has at least one edge into a different partition."""
+    mask = np.zeros(part_of.shape[0], dtype=np.bool_)
+    for e in range(edges_u.shape[0]):
+        u, v = edges_u[e], edges_v[e]
+        if part_of[u] != part_of[v]:
+            mask[u] = True
+            mask[v] = True
+    return mask
+
+@njit(cache=True)
+def _pop_best(heap, gain, locked, side, from_side):
+    """Pops the highest-gain unlocked vertex of a side, skipping stale heap entries. Returns -1 if none."""
+    while len(heap) > 0:
+        neg_gain, v = heapq.heappop(heap)
+        if not locked[v] and side[v] == from_side and -neg_gain == gain[v]:
+            return v
+    return -1
+
+@njit(cache=True)
+def _move(v, lock, indptr, indices, weights, side, gain, locked, heap_A, heap_B):
+    """Moves a vertex to the other side and updates its unlocked neighbors' gains by +/-2w."""
+    locked[v] = lock
+    for e in range(indptr[v], indptr[v + 1]):
+        w = np.int64(indices[e])
+        if w == v or locked[w]:
+            continue
+        if side[w] == side[v]:
+            gain[w] += 2 * weights[e]
+        else:
+            gain[w] -= 2 * weights[e]
+        heapq.heappush(heap_A if side[w] else heap_B, (-gain[w], w))
+    side[v] = not side[v]
+    gain[v] = -gain[v]
+    if not lock:
+        heapq.heappush(heap_A if side[v] else heap_B, (-gain[v], v))
+
+@njit(cache=True)
+def _init_gains(indptr, indices, weights, side, gain, locked):
+    """Resets locks and computes gain[v] = external weight - internal weight. Returns both side heaps."""
+    n = side.shape[0]
+    for v in range(n):
+        gain[v] = 0.0
+        locked[v] = False
+        for e in range(indptr[v], indptr[v + 1]):
+            w = indices[e]
+            if w != v:
+                gain[v] += weights[e] if side[w] != side[v] else -weights[e]
+    heap_A = [(-gain[v], v) for v in range(n) if side[v]]
+    heap_B = [(-gain[v], v) for v in range(n) if not side[v]]
+    heapq.heapify(heap_A)
+    heapq.heapify(heap_B)
+    return heap_A, heap_B
+
+@njit(cache=True)
+def kl_refine(
+    indptr: np.ndarray,
+    indices: np.ndarray,
+    weights: np.ndarray,
+    side: np.ndarray,
+    max_iter: int
+) -> np.ndarray:
+    """
+    Kernighan-Lin refinement of a bisection given as CSR adjacency arrays.
+
+    Each pass uses the best-node-first sweep: the highest-gain unlocked vertex is
+    taken from one side, neighbor gains are updated by +/-2w, then the best vertex
+    from the other side is taken. Gains live in one binary heap per side with lazy
+    deletion, so a pass costs O(|E| log |V|) instead of the O(|V|^2) pair search.
+    The best prefix of swaps is kept and passes stop once no prefix improves the cut.
+    Swaps keep the side sizes fixed, so if the sides differ in size the highest-gain
+    vertices of the larger side are first moved across to balance them. This is a
+    deliberate choice to keep partitions near the target size: it can raise the cut
+    compared with refining uneven sides as given, but it stays below the random
+    balanced split the original networkx call started from.
+
+    Args:
+        indptr, indices, weights: The symmetric CSR adjacency of the subgraph.
+        side (np.ndarray[bool]): The initial side of each vertex (True for side A).
+        max_iter (int): The maximum number of passes.
+
+    Returns:
+        np.ndarray[bool]: The refined side of each vertex.
+    """
+    n = side.shape[0]
+    side = side.copy()
+    gain = np.zeros(n, dtype=np.float64)
+    locked = np.zeros(n, dtype=np.bool_)
+
+    # Deliberately balance the sides before refining (swaps alone keep them uneven)
+    heap_A, heap_B = _init_gains(indptr, indices, weights, side, gain, locked)
+    size_A = int(side.sum())
+    while abs(2 * size_A - n) > 1:
+        larger = 2 * size_A > n
+        v = _pop_best(heap_A if larger else heap_B, gain, locked, side, larger)
+        _move(v, False, indptr, indices, weights, side, gain, locked, heap_A, heap_B)
+        size_A += -1 if larger else 1
+
+    moved_A = np.empty(n, dtype=np.int64)
+    moved_B = np.empty(n, dtype=np.int64)
+    for _ in range(max_iter):
+        heap_A, heap_B = _init_gains(indptr, indices, weights, side, gain, locked)
+        num_swaps = min(len(heap_A), len(heap_B))
+        cumulative, best_gain, best_prefix = 0.0, 0.0, 0
+
+        for step in range(num_swaps):
+            a = _pop_best(heap_A, gain, locked, side, True)
+            pair_gain = gain[a]
+            _move(a, True, indptr, indices, weights, side, gain, locked, heap_A, heap_B)
+            b = _pop_best(heap_B, gain, locked, side, False)
+            # b's gain already accounts for a having moved, i.e. D_a + D_b - 2c_ab
+            pair_gain += gain[b]
+            _move(b, True, indptr, indices, weights, side, gain, locked, heap_A, heap_B)
+            moved_A[step], moved_B[step] = a, b
+
+            cumulative += pair_gain
+            if cumulative > best_gain:
+                best_gain, best_prefix = cumulative, step + 1
+
+        # Undo every swap past the best prefix
+        for step in range(best_prefix, num_swaps):
+            side[moved_A[step]] = not side[moved_A[step]]
+            side[moved_B[step]] = not side[moved_B[step]]
+
+        if best_prefix == 0:
+            break
+
+    return side
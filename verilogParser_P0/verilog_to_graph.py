@@ -1,25 +1,23 @@
 import argparse
 import re
 import networkx as nx
-import matplotlib.pyplot as plt
+import numpy as np
 import pickle
 
-# You may need to install pydot and graphviz for the layout
-# pip install pydot
-# See: https://graphviz.org/download/
-try:
-    from networkx.drawing.nx_pydot import graphviz_layout
-except ImportError:
-    print("Warning: pydot and graphviz not found. Using a different layout.")
-    def graphviz_layout(G, prog='dot'):
-        return nx.spring_layout(G, seed=42)
-
 
 # Regex patterns to parse Verilog netlists
-INPUT_PATTERN = r"input\s+([^;]+);"
-OUTPUT_PATTERN = r"output\s+([^;]+);"
-WIRE_PATTERN = r"wire\s+([^;]+);"
+DECLARATION_PATTERN = r"\b(?P<kind>input|output|wire)\s+(?P<signals>[^;]+);"
 GATE_INSTANCE_PATTERN = r"\s*\b(and|or|not|nand|nor|xor|xnor|buf)\b\s+(\w+)\s*\(([^;]+)\);"
+SIGNAL_SEPARATOR_PATTERN = r"\s*,\s*"
+
+# Compiled once so each netlist is scanned a single time per pattern
+DECLARATION_RE = re.compile(DECLARATION_PATTERN)
+GATE_INSTANCE_RE = re.compile(GATE_INSTANCE_PATTERN)
+SIGNAL_SEPARATOR_RE = re.compile(SIGNAL_SEPARATOR_PATTERN)
+
+def _split_signals(signal_list):
+    """Splits a comma-separated signal list into stripped, non-empty names."""
+    return [s for s in SIGNAL_SEPARATOR_RE.split(signal_list.strip()) if s]
 
 def create_graph_from_verilog(file_path):
     """
@@ -34,46 +32,48 @@ def create_graph_from_verilog(file_path):
         return None
 
     content = content.replace('\\', '')
-    G = nx.DiGraph()
+
+    # Nodes and edges are collected first and inserted into the graph in bulk.
+    # The dict keeps first-seen node order and lets later entries override attributes.
+    node_attrs = {}
+    edges = []
 
     # Step 1: Parse and add all signal nodes (PIs, POs, Wires)
-    for match in re.finditer(INPUT_PATTERN, content):
-        signals = [s.strip() for s in match.group(1).split(',') if s.strip()]
-        for signal in signals:
-            G.add_node(signal, type='PI')
-
-    for match in re.finditer(OUTPUT_PATTERN, content):
-        signals = [s.strip() for s in match.group(1).split(',') if s.strip()]
-        for signal in signals:
-            if G.has_node(signal):
-                G.nodes[signal]['type'] = 'PO'
-            else:
-                G.add_node(signal, type='PO')
-
-    for match in re.finditer(WIRE_PATTERN, content):
-        signals = [s.strip() for s in match.group(1).split(',') if s.strip()]
-        for signal in signals:
-            if not G.has_node(signal):
-                G.add_node(signal, type='wire')
+    # All declarations are collected in one scan, then applied in the order
+    # inputs, outputs, wires so that POs override PIs and wires never override either.
+    declarations = {'input': [], 'output': [], 'wire': []}
+    for match in DECLARATION_RE.finditer(content):
+        declarations[match.group('kind')].extend(_split_signals(match.group('signals')))
+
+    for signal in declarations['input']:
+        node_attrs[signal] = {'type': 'PI'}
+
+    for signal in declarations['output']:
+        node_attrs[signal] = {'type': 'PO'}
+
+    for signal in declarations['wire']:
+        node_attrs.setdefault(signal, {'type': 'wire'})
 
     # Step 2: Parse gates, add them as nodes, and create connections (edges)
-    for match in re.finditer(GATE_INSTANCE_PATTERN, content):
+    for match in GATE_INSTANCE_RE.finditer(content):
         gate_type, instance_name, connections_str = match.groups()
         
-        G.add_node(instance_name, type='gate', func=gate_type)
+        node_attrs[instance_name] = {'type': 'gate', 'func': gate_type}
 
-        connections = [c.strip() for c in connections_str.split(',')]
+        connections = SIGNAL_SEPARATOR_RE.split(connections_str.strip())
         output_signal = connections[0]
         input_signals = connections[1:]
 
-        if not G.has_node(output_signal):
-             G.add_node(output_signal, type='wire')
-        G.add_edge(instance_name, output_signal)
+        node_attrs.setdefault(output_signal, {'type': 'wire'})
+        edges.append((instance_name, output_signal))
 
         for input_signal in input_signals:
-            if not G.has_node(input_signal):
-                G.add_node(input_signal, type='wire')
-            G.add_edge(input_signal, instance_name)
+            node_attrs.setdefault(input_signal, {'type': 'wire'})
+            edges.append((input_signal, instance_name))
+
+    G = nx.DiGraph()
+    G.add_nodes_from(node_attrs.items())
+    G.add_edges_from(edges)
 
     return G
 
@@ -106,10 +106,54 @@ def collapse_wire_nodes(G):
     G.remove_nodes_from(wire_nodes)
     return G
 
+def save_csr(G, path):
+    """
+    Saves the graph in a compact integer CSR format (.npz) for the partitioner.
+
+    Nodes are stored once by name and referenced by integer id everywhere else:
+    'indptr'/'indices' hold the undirected CSR adjacency, and 'edges_src'/'edges_dst'
+    the directed edge list. Node attributes are not stored.
+    """
+    node_list = list(G.nodes())
+    node_ids = {node: i for i, node in enumerate(node_list)}
+    if node_list:
+        adj = nx.to_scipy_sparse_array(G.to_undirected(), nodelist=node_list, format='csr')
+        indptr, indices = adj.indptr, adj.indices
+    else:
+        # nx.to_scipy_sparse_array raises on a graph without nodes
+        indptr, indices = np.zeros(1), np.empty(0)
+
+    edges = np.array(
+        [(node_ids[u], node_ids[v]) for u, v in G.edges()], dtype=np.int32
+    ).reshape(-1, 2)
+
+    np.savez_compressed(
+        path,
+        names=np.array([str(node) for node in node_list], dtype=str),
+        indptr=indptr.astype(np.int32),
+        indices=indices.astype(np.int32),
+        edges_src=edges[:, 0],
+        edges_dst=edges[:, 1],
+    )
+
 def visualize_graph(graph, file_name, output_image_path=None):
     """
     Creates a visualization of the circuit graph.
     """
+    # Visualization libraries are imported here so that saving graphs stays fast
+    import matplotlib.pyplot as plt
+
+    # You may need to install pydot and graphviz for the layout
+    # pip install pydot
+    # See: https://graphviz.org/download/
+    try:
+        import pydot  # noqa: F401 (networkx only imports it when the layout is computed)
+        from networkx.drawing.nx_pydot import graphviz_layout
+    except ImportError:
+        print("Warning: pydot and graphviz not found. Using a different layout.")
+        def graphviz_layout(G, prog='dot'):
+            return nx.spring_layout(G, seed=42)
+
     plt.figure(figsize=(15, 10))
     plt.title(f"Circuit Graph for {file_name}", size=15)
 
@@ -152,6 +196,10 @@ def main():
         "-s", "--save_graph",
         help="Path to save the NetworkX graph object (e.g., 'circuit.gpickle')."
     )
+    parser.add_argument(
+        "--save-csr",
+        help="Path to save the graph in compact CSR format for the partitioner (e.g., 'circuit.npz')."
+    )
     # --- NEW ARGUMENT ---
     parser.add_argument(
         "--collapse-wires",
@@ -183,7 +231,9 @@ def main():
 
         print(f"📊 Graph contains {circuit_graph.number_of_nodes()} nodes and {circuit_graph.number_of_edges()} edges.")
         
-        visualize_graph(circuit_graph, args.verilog_file, args.output_image)
+        # Only draw when an image is requested or nothing is being saved
+        if args.output_image or not (args.save_graph or args.save_csr):
+            visualize_graph(circuit_graph, args.verilog_file, args.output_image)
         
         if args.save_graph:
             try:
@@ -193,5 +243,12 @@ def main():
             except Exception as e:
                 print(f"Could not save graph object: {e}")
 
+        if args.save_csr:
+            try:
+                save_csr(circuit_graph, args.save_csr)
+                print(f"💾 CSR graph saved to: {args.save_csr}")
+            except Exception as e:
+                print(f"Could not save CSR graph: {e}")
+
 if __name__ == "__main__":
     main()
\ No newline at end of file